@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Leonardo La Rocca
+
+NMEA SENTENCE STRUCTURE:
+        each sentence is made of printable ASCII characters, it starts with
+        a '$' and ends with the checksum and a carriage return + line feed.
+        $ | talker id (2 chars) | sentence type (3 chars) | ,field,field,... | * | checksum (2 hex chars) | \\r\\n
+
+    NMEA CHECKSUM:
+        The checksum is the exclusive OR of all the characters between the
+        '$' and the '*' (both excluded), written as two hexadecimal digits.
+
+    The fields of a sentence are split only when they are first accessed,
+    sentences that are never read cost only the checksum verification.
+"""
+
+NMEA_START_CHAR = 0x24  # '$'
+NMEA_CHECKSUM_CHAR = 0x2A  # '*'
+NMEA_END_CHARS = b"\r\n"
+
+#******* DEBUG/HELPING CONSTANTS ********
+# The standard limit is 82 chars, u-blox proprietary sentences can be longer
+MAX_SENTENCE_LENGTH = 120
+
+#********* SENTENCE TYPES **********
+GGA = "GGA"
+RMC = "RMC"
+VTG = "VTG"
+GSV = "GSV"
+
+#********* PARSED DATA TAGS **********
+TALKER_TAG = "talker"
+SENTENCE_TYPE_TAG = "sentence_type"
+
+HOUR_TAG = "hour"
+MINUTE_TAG = "minute"
+SECOND_TAG = "second"
+YEAR_TAG = "year"
+MONTH_TAG = "month"
+DAY_TAG = "day"
+
+LATITUDE_TAG = "latitude"
+LONGITUDE_TAG = "longitude"
+QUALITY_TAG = "quality"
+NUM_SATELLITES_TAG = "num_satellites"
+HDOP_TAG = "HDOP"
+MSL_HEIGHT_TAG = "MSL_height"
+GEOID_SEPARATION_TAG = "geoid_separation"
+
+VALID_TAG = "valid"
+GROUND_SPEED_KNOTS_TAG = "ground_speed_knots"
+GROUND_SPEED_KMH_TAG = "ground_speed_kmh"
+COURSE_TRUE_TAG = "course_over_ground"
+COURSE_MAGNETIC_TAG = "course_over_ground_magnetic"
+MAGNETIC_VARIATION_TAG = "magnetic_variation"
+MODE_TAG = "mode"
+
+NUM_MESSAGES_TAG = "num_messages"
+MESSAGE_NUMBER_TAG = "message_number"
+SATELLITES_IN_VIEW_TAG = "satellites_in_view"
+SATELLITES_TAG = "satellites"
+SV_ID_TAG = "sv_id"
+ELEVATION_TAG = "elevation"
+AZIMUTH_TAG = "azimuth"
+CN0_TAG = "cn0"
+
+#********* GGA QUALITY INDICATOR **********
+GGA_QUALITY = {0: "no fix", 1: "autonomous GNSS fix", 2: "differential GNSS fix",
+               4: "RTK fixed", 5: "RTK float", 6: "estimated/dead reckoning fix"}
+
+
+class NMEASentence():
+    """A checksum verified NMEA sentence. The raw sentence is kept as is and
+    the comma separated fields are split only on first access."""
+
+    __slots__ = ("raw", "_fields")
+
+    def __init__(self, raw):
+        # raw is the sentence without the leading '$' and without '*CS\r\n'
+        self.raw = raw
+        self._fields = None
+
+    @property
+    def talker(self):
+        return self.raw[0:2]
+
+    @property
+    def sentence_type(self):
+        return self.raw[2:5]
+
+    @property
+    def fields(self):
+        """the data fields of the sentence (the address field is excluded)"""
+        if self._fields is None:
+            self._fields = self.raw.split(",")[1:]
+        return self._fields
+
+    def __getitem__(self, index):
+        return self.fields[index]
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return "NMEASentence(${})".format(self.raw)
+
+
+def compute_checksum(data):
+    """returns the xor of all the bytes in data"""
+    checksum = 0
+    for byte in data:
+        checksum ^= byte
+    return checksum
+
+
+def parse_sentence(sentence):
+    """returns a NMEASentence from the bytes of a full sentence ('$' up to
+    and including '\\r\\n') or None if the sentence is malformed or the
+    checksum does not match."""
+    sentence = bytes(sentence)
+    if len(sentence) < 11 or sentence[0] != NMEA_START_CHAR or not sentence.endswith(NMEA_END_CHARS):
+        return None
+
+    # the checksum char is always at a fixed position from the end
+    if sentence[-5] != NMEA_CHECKSUM_CHAR:
+        return None
+
+    body = sentence[1:-5]
+    # the address field (talker id + sentence type, or P + manufacturer id
+    # for proprietary sentences) is alphanumeric only
+    address_end = body.find(b",")
+    address = body if address_end == -1 else body[:address_end]
+    if len(address) < 2 or not address.isalnum():
+        return None
+
+    try:
+        expected = int(sentence[-4:-2], 16)
+    except ValueError:
+        return None
+    if compute_checksum(body) != expected:
+        return None
+
+    try:
+        return NMEASentence(body.decode("ascii"))
+    except UnicodeDecodeError:
+        return None
+
+
+def compose_sentence(body):
+    """returns the bytes of a NMEA sentence with the given body (talker id,
+    sentence type and fields, without '$'), checksum and line end included."""
+    body = body.encode("ascii") if isinstance(body, str) else bytes(body)
+    return b"$" + body + "*{:02X}".format(compute_checksum(body)).encode("ascii") + NMEA_END_CHARS
+
+
+#********* FIELD CONVERSION **********
+def _to_float(field):
+    return float(field) if field else None
+
+
+def _to_int(field):
+    return int(field) if field else None
+
+
+def _to_degrees(field, hemisphere):
+    """converts a (d)ddmm.mmmmm field and its hemisphere to signed degrees"""
+    if not field:
+        return None
+    dot = field.find(".")
+    if dot == -1:
+        dot = len(field)
+    degrees = int(field[:dot - 2]) + float(field[dot - 2:]) / 60
+    return -degrees if hemisphere in ("S", "W") else degrees
+
+
+def _parse_time(field, data):
+    """hhmmss.ss, all the tags are None if the field is empty"""
+    if len(field) >= 6:
+        data[HOUR_TAG] = int(field[0:2])
+        data[MINUTE_TAG] = int(field[2:4])
+        data[SECOND_TAG] = float(field[4:])
+    else:
+        data[HOUR_TAG] = data[MINUTE_TAG] = data[SECOND_TAG] = None
+
+
+def _parse_date(field, data):
+    """ddmmyy, all the tags are None if the field is empty"""
+    if len(field) == 6:
+        data[DAY_TAG] = int(field[0:2])
+        data[MONTH_TAG] = int(field[2:4])
+        data[YEAR_TAG] = 2000 + int(field[4:6])
+    else:
+        data[DAY_TAG] = data[MONTH_TAG] = data[YEAR_TAG] = None
+
+
+#********* SENTENCE PARSERS **********
+def parse_gga(sentence):
+    """Global positioning system fix data"""
+    f = sentence.fields
+    data = dict()
+    _parse_time(f[0], data)
+    data[LATITUDE_TAG] = _to_degrees(f[1], f[2])
+    data[LONGITUDE_TAG] = _to_degrees(f[3], f[4])
+    quality = _to_int(f[5])
+    data[QUALITY_TAG] = GGA_QUALITY.get(quality, quality)
+    data[NUM_SATELLITES_TAG] = _to_int(f[6])
+    data[HDOP_TAG] = _to_float(f[7])
+    data[MSL_HEIGHT_TAG] = _to_float(f[8])
+    data[GEOID_SEPARATION_TAG] = _to_float(f[10])
+    return data
+
+
+def parse_rmc(sentence):
+    """Recommended minimum data"""
+    f = sentence.fields
+    data = dict()
+    _parse_time(f[0], data)
+    data[VALID_TAG] = f[1] == "A"
+    data[LATITUDE_TAG] = _to_degrees(f[2], f[3])
+    data[LONGITUDE_TAG] = _to_degrees(f[4], f[5])
+    data[GROUND_SPEED_KNOTS_TAG] = _to_float(f[6])
+    data[COURSE_TRUE_TAG] = _to_float(f[7])
+    _parse_date(f[8], data)
+    mag_var = _to_float(f[9])
+    if mag_var is not None and f[10] == "W":
+        mag_var = -mag_var
+    data[MAGNETIC_VARIATION_TAG] = mag_var
+    data[MODE_TAG] = f[11] if len(f) > 11 else None
+    return data
+
+
+def parse_vtg(sentence):
+    """Course over ground and ground speed"""
+    f = sentence.fields
+    data = dict()
+    data[COURSE_TRUE_TAG] = _to_float(f[0])
+    data[COURSE_MAGNETIC_TAG] = _to_float(f[2])
+    data[GROUND_SPEED_KNOTS_TAG] = _to_float(f[4])
+    data[GROUND_SPEED_KMH_TAG] = _to_float(f[6])
+    data[MODE_TAG] = f[8] if len(f) > 8 else None
+    return data
+
+
+def parse_gsv(sentence):
+    """GNSS satellites in view, every sentence carries up to 4 satellites"""
+    f = sentence.fields
+    data = dict()
+    data[NUM_MESSAGES_TAG] = _to_int(f[0])
+    data[MESSAGE_NUMBER_TAG] = _to_int(f[1])
+    data[SATELLITES_IN_VIEW_TAG] = _to_int(f[2])
+    satellites = []
+    # NMEA 4.10 appends a signal id, it is ignored when present
+    for i in range(3, len(f) - 3, 4):
+        satellites.append({SV_ID_TAG: _to_int(f[i]),
+                           ELEVATION_TAG: _to_int(f[i + 1]),
+                           AZIMUTH_TAG: _to_int(f[i + 2]),
+                           CN0_TAG: _to_int(f[i + 3])})
+    data[SATELLITES_TAG] = satellites
+    return data
+
+
+SENTENCE_PARSERS = {GGA: parse_gga, RMC: parse_rmc, VTG: parse_vtg, GSV: parse_gsv}
+
+
+def sentence_to_dict(sentence):
+    """returns a dictionary with the content of a GGA, RMC, VTG or GSV
+    sentence or None if the sentence type is not supported or a field is
+    malformed."""
+    parser = SENTENCE_PARSERS.get(sentence.sentence_type)
+    if parser is None:
+        return None
+    try:
+        data = parser(sentence)
+    except (IndexError, ValueError):
+        return None
+    data[TALKER_TAG] = sentence.talker
+    data[SENTENCE_TYPE_TAG] = sentence.sentence_type
+    return data
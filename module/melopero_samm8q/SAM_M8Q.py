@@ -5,12 +5,15 @@
 """
 from smbus2 import SMBus, i2c_msg
 import melopero_ubx as ubx
+import melopero_samm8q.NMEA_MSG as nmea
+from melopero_samm8q.StreamDemultiplexer import StreamDemultiplexer
 import time
 
 
 class SAM_M8Q():
     _DEFAULT_I2C_ADDRESS = 0x42
     _DATA_STREAM_REGISTER = 0xFF
+    _MAX_READ_CHUNK = 255
 
     YEAR_TAG = "year"
     MONTH_TAG = "month"
@@ -49,6 +52,7 @@ class SAM_M8Q():
         self.curr_i2c_addr = i2c_addr
         self.curr_i2c_bus = i2c_bus
         self.pvt_data = dict()
+        self.stream = StreamDemultiplexer()
         time.sleep(.1)  # Allows the device to setup Avoids i2c error 5
 
     def ubx_only(self):
@@ -58,6 +62,15 @@ class SAM_M8Q():
         message = ubx.compose_message(ubx.CFG_CLASS, ubx.CFG_PRT, 20, payload)
         self.write_message(message)
 
+    def ubx_and_nmea(self):
+        """Sets the communication protocol to UBX and NMEA both for input and output.
+        The received messages are split by the stream demultiplexer, UBX messages
+        can be read with wait_for_message and NMEA sentences with wait_for_nmea_sentence"""
+        payload = [0x00, 0x00, 0x00, 0x00, 0x84, 0x00, 0x00, 0x00, 0x00, 0x00,
+                   0x00, 0x00, 0x03, 0x00, 0x03, 0x00, 0x00, 0x00, 0x00, 0x00]
+        message = ubx.compose_message(ubx.CFG_CLASS, ubx.CFG_PRT, 20, payload)
+        self.write_message(message)
+
     def set_message_frequency(self, msg_class, msg_id, freq=0x01):
         """Send rate is relative to the event a message is registered on.
         For example, if the rate of a navigation message is set to 2,
@@ -103,23 +116,40 @@ class SAM_M8Q():
             bus.i2c_rdwr(msg_out)
 
     def read_message(self):
-        msg_length = self.available_bytes()
-        msg = []
-        if msg_length > ubx.MAX_MESSAGE_LENGTH:
-            return msg
-
+        """reads the available bytes through the stream demultiplexer and returns
+        the oldest received UBX message (an empty list if there is none)"""
+        self.read_stream()
+        msg = self.stream.pop_ubx_message()
+        return msg if msg is not None else []
+
+    def read_stream(self):
+        """reads all the available bytes and feeds them to the stream demultiplexer,
+        no byte is discarded: large amounts of data are read in chunks"""
+        remaining = self.available_bytes()
         with SMBus(self.curr_i2c_bus) as bus:
-            for _ in range(msg_length):
-                msg.append(bus.read_byte_data(self.curr_i2c_addr, self._DATA_STREAM_REGISTER))
-
-        return msg
+            while remaining > 0:
+                chunk = min(remaining, self._MAX_READ_CHUNK)
+                msg_out = i2c_msg.write(self.curr_i2c_addr, [self._DATA_STREAM_REGISTER])
+                msg_in = i2c_msg.read(self.curr_i2c_addr, chunk)
+                bus.i2c_rdwr(msg_out, msg_in)
+                self.stream.feed(bytes(msg_in))
+                remaining -= chunk
 
     def poll_message(self, msg_class, msg_id):
+        self.discard_messages(msg_class, msg_id)
         msg = ubx.compose_message(msg_class, msg_id, 0)
         self.write_message(msg)
         return self.wait_for_message(msg_cls=msg_class, msg_id=msg_id)
 
-    def wait_for_message(self, time_out_s=1, interval_s=0.01, msg_cls=None, msg_id=None):
+    def discard_messages(self, msg_cls=None, msg_id=None):
+        """reads the available bytes and drops the queued UBX messages of the
+        given class and id, so that the next message waited for is a fresh one
+        (e.g. the response to a poll)"""
+        self.read_stream()
+        self.stream.discard_ubx_messages(msg_cls, msg_id)
+
+    def wait_for_message(self, time_out_s=1, interval_s=0.01, msg_cls=None, msg_id=None, newest=False,
+                         payload_prefix=None):
         """ waits for a message of a given class and id.\n
         time_out_s :
             the maximum amount of time to wait for the message to arrive in seconds.
@@ -128,27 +158,58 @@ class SAM_M8Q():
         msg_cls :
             the class of the message to wait for.
         msg_id :
-            the id of the message to wait for."""
+            the id of the message to wait for.
+        newest :
+            if true the most recent queued message is returned and the older
+            ones of the same class and id are dropped, else the oldest one.
+        payload_prefix :
+            if specified only a message whose payload starts with these bytes is returned."""
         start_time = time.time()
-        to_compare = [ubx.SYNC_CHAR_1, ubx.SYNC_CHAR_2]
-        if msg_cls:
-            to_compare.append(msg_cls)
-        if msg_id:
-            to_compare.append(msg_id)
+        while time.time() - start_time < time_out_s:
+            self.read_stream()
+            msg = self.stream.pop_ubx_message(msg_cls, msg_id, newest, payload_prefix)
+            if msg is not None:
+                return msg
+            time.sleep(interval_s)
+        return None
 
+    def wait_for_nmea_sentence(self, time_out_s=1, interval_s=0.01, sentence_type=None, newest=False):
+        """ waits for a NMEA sentence of a given type, the NMEA output must be
+        enabled (see ubx_and_nmea).\n
+        time_out_s :
+            the maximum amount of time to wait for the sentence to arrive in seconds.
+        interval_s :
+            the interval in seconds between a two readings.
+        sentence_type :
+            the type of the sentence to wait for (e.g. nmea.GGA), any type if None.
+        newest :
+            if true the most recent queued sentence is returned and the older
+            ones of the same type are dropped, else the oldest one.
+        Returns a NMEASentence, its content can be converted to a dictionary
+        with nmea.sentence_to_dict"""
+        start_time = time.time()
         while time.time() - start_time < time_out_s:
-            msg = self.read_message()
-            if len(msg) >= len(to_compare):
-                if msg[:len(to_compare)] == to_compare:
-                    return msg
+            self.read_stream()
+            sentence = self.stream.pop_nmea_sentence(sentence_type, newest)
+            if sentence is not None:
+                return sentence
             time.sleep(interval_s)
         return None
 
+    def get_nmea_data(self, sentence_type, time_out_s=1):
+        """waits for a GGA, RMC, VTG or GSV sentence and returns the content of
+        the most recent one as a dictionary (see the tags in NMEA_MSG) or None"""
+        sentence = self.wait_for_nmea_sentence(time_out_s=time_out_s, sentence_type=sentence_type, newest=True)
+        if sentence is None:
+            return None
+        return nmea.sentence_to_dict(sentence)
+
     def wait_for_acknowledge(self, msg_class, msg_id, verbose=True):
         """ An acknowledge message (or a Not Acknowledge message) is sent everytime
-        after a configuration message is sent."""
+        after a configuration message is sent, the payload of the ACK/NAK
+        contains the class and id of the acknowledged message."""
         ack = False
-        msg = self.wait_for_message(msg_cls=ubx.ACK_CLASS)
+        msg = self.wait_for_message(msg_cls=ubx.ACK_CLASS, payload_prefix=[msg_class, msg_id])
         if msg is None:
             print("No ACK/NAK Message received")
             return ack
@@ -174,12 +235,15 @@ class SAM_M8Q():
         increased with set_message_frequency and set_measurement_freq
         """
         if polling:
+            # drop the queued pvt messages so that the poll response is returned
+            self.discard_messages(ubx.NAV_CLASS, ubx.NAV_PVT)
             # send polling message
             message = ubx.compose_message(ubx.NAV_CLASS, ubx.NAV_PVT)
             self.write_message(message)
 
         # reads response
-        read = self.wait_for_message(time_out_s=time_out_s, msg_cls=ubx.NAV_CLASS, msg_id=ubx.NAV_PVT)
+        read = self.wait_for_message(time_out_s=time_out_s, msg_cls=ubx.NAV_CLASS, msg_id=ubx.NAV_PVT,
+                                     newest=True)
         if read is not None:
             start_payload = 6
             # WARNING: POSITION_DOP AND ITOW ARE MISSING (NOT RETRIEVED)
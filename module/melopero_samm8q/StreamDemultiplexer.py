@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Leonardo La Rocca
+"""
+from collections import deque
+import melopero_ubx as ubx
+import melopero_samm8q.NMEA_MSG as nmea
+
+
+class StreamDemultiplexer():
+    """Splits a mixed byte stream into UBX messages and NMEA sentences.
+    Bytes can be fed in chunks of any size, incomplete frames are kept
+    until the rest of the frame arrives. UBX messages are returned as lists
+    of bytes (like read_message does), NMEA sentences as NMEASentence objects.
+    Frames with a wrong checksum and bytes that belong to no frame are dropped."""
+
+    _UBX_SYNC = bytes([ubx.SYNC_CHAR_1, ubx.SYNC_CHAR_2])
+    _NMEA_START = b"$"
+    _UBX_HEADER_LENGTH = 6
+
+    def __init__(self, max_queued_messages=32):
+        self._buffer = bytearray()
+        self.ubx_messages = deque(maxlen=max_queued_messages)
+        self.nmea_sentences = deque(maxlen=max_queued_messages)
+
+    def feed(self, data):
+        """adds the bytes in data to the stream and queues every complete frame"""
+        self._buffer.extend(data)
+        buf = self._buffer
+        pos = 0
+
+        while True:
+            ubx_start = buf.find(self._UBX_SYNC, pos)
+            nmea_start = buf.find(self._NMEA_START, pos)
+
+            if ubx_start == -1 and nmea_start == -1:
+                # keep a trailing sync char, the second one may be in the next chunk
+                pos = len(buf) - 1 if buf and buf[-1] == ubx.SYNC_CHAR_1 else len(buf)
+                break
+
+            if nmea_start == -1 or (ubx_start != -1 and ubx_start < nmea_start):
+                end = self._ubx_frame_end(buf, ubx_start)
+                if end is None:
+                    # NMEA never contains 0xB5: a valid sentence inside the pending
+                    # frame means that the frame header is corrupted
+                    if self._contains_nmea_sentence(buf, ubx_start + 2):
+                        pos = ubx_start + 1
+                        continue
+                    pos = ubx_start
+                    break
+                if end == -1:
+                    pos = ubx_start + 1
+                else:
+                    self.ubx_messages.append(list(buf[ubx_start:end]))
+                    pos = end
+            else:
+                # NMEA is plain ASCII: a sentence never goes past the next UBX sync
+                search_end = nmea_start + nmea.MAX_SENTENCE_LENGTH
+                if ubx_start != -1:
+                    search_end = min(search_end, ubx_start)
+                line_end = buf.find(b"\n", nmea_start, search_end)
+                if line_end == -1:
+                    # a UBX sync after the '$' means a broken sentence
+                    if ubx_start == -1 and len(buf) - nmea_start < nmea.MAX_SENTENCE_LENGTH:
+                        pos = nmea_start
+                        break
+                    pos = nmea_start + 1
+                    continue
+                # start from the last '$' so that stray ones are not part of the sentence
+                nmea_start = buf.rfind(self._NMEA_START, nmea_start, line_end)
+                sentence = nmea.parse_sentence(buf[nmea_start:line_end + 1])
+                if sentence is None:
+                    pos = nmea_start + 1
+                else:
+                    self.nmea_sentences.append(sentence)
+                    pos = line_end + 1
+
+        del buf[:pos]
+
+    def _ubx_frame_end(self, buf, start):
+        """returns the index after the UBX frame starting at start, None if
+        the frame is not complete yet or -1 if it is not a valid frame"""
+        if len(buf) - start < self._UBX_HEADER_LENGTH:
+            return None
+        length = ubx.u2_to_int(buf[start + 4:start + 6])
+        end = start + self._UBX_HEADER_LENGTH + length + 2
+        if end - start > ubx.MAX_MESSAGE_LENGTH:
+            return -1
+        if len(buf) < end:
+            return None
+        ck_a, ck_b = ubx.compute_checksum(buf[start + 2:end - 2])
+        if ck_a != buf[end - 2] or ck_b != buf[end - 1]:
+            return -1
+        return end
+
+    def _contains_nmea_sentence(self, buf, start):
+        """returns True if there is a complete and valid NMEA sentence after start"""
+        nmea_start = buf.find(self._NMEA_START, start)
+        while nmea_start != -1:
+            search_end = nmea_start + nmea.MAX_SENTENCE_LENGTH
+            next_ubx = buf.find(self._UBX_SYNC, nmea_start, search_end)
+            if next_ubx != -1:
+                search_end = next_ubx
+            line_end = buf.find(b"\n", nmea_start, search_end)
+            if line_end == -1:
+                if next_ubx == -1:
+                    return False
+                nmea_start = buf.find(self._NMEA_START, next_ubx)
+                continue
+            nmea_start = buf.rfind(self._NMEA_START, nmea_start, line_end)
+            if nmea.parse_sentence(buf[nmea_start:line_end + 1]) is not None:
+                return True
+            nmea_start = buf.find(self._NMEA_START, line_end)
+        return False
+
+    @staticmethod
+    def _pop_match(queue, is_match, newest):
+        """removes and returns the oldest (or the newest, dropping the older
+        ones) item of the queue for which is_match is true or None"""
+        if newest:
+            match = None
+            for item in queue:
+                if is_match(item):
+                    match = item
+            if match is not None:
+                StreamDemultiplexer._discard_matches(queue, is_match)
+            return match
+
+        for i, item in enumerate(queue):
+            if is_match(item):
+                del queue[i]
+                return item
+        return None
+
+    @staticmethod
+    def _discard_matches(queue, is_match):
+        kept = [item for item in queue if not is_match(item)]
+        queue.clear()
+        queue.extend(kept)
+
+    @staticmethod
+    def _ubx_matcher(msg_cls, msg_id, payload_prefix):
+        def is_match(msg):
+            return ((msg_cls is None or msg[2] == msg_cls) and (msg_id is None or msg[3] == msg_id)
+                    and (payload_prefix is None or msg[6:6 + len(payload_prefix)] == list(payload_prefix)))
+        return is_match
+
+    @staticmethod
+    def _nmea_matcher(sentence_type):
+        def is_match(sentence):
+            return sentence_type is None or sentence.sentence_type == sentence_type
+        return is_match
+
+    def pop_ubx_message(self, msg_cls=None, msg_id=None, newest=False, payload_prefix=None):
+        """removes and returns the oldest queued UBX message with the given
+        class and id (any if not specified) or None. If payload_prefix is given
+        the payload must start with those bytes. If newest is True the most
+        recent match is returned and the older matches are dropped."""
+        return self._pop_match(self.ubx_messages, self._ubx_matcher(msg_cls, msg_id, payload_prefix), newest)
+
+    def discard_ubx_messages(self, msg_cls=None, msg_id=None):
+        """removes all the queued UBX messages with the given class and id"""
+        self._discard_matches(self.ubx_messages, self._ubx_matcher(msg_cls, msg_id, None))
+
+    def pop_nmea_sentence(self, sentence_type=None, newest=False):
+        """removes and returns the oldest queued NMEA sentence of the given
+        type (any if not specified) or None. If newest is True the most recent
+        match is returned and the older matches are dropped."""
+        return self._pop_match(self.nmea_sentences, self._nmea_matcher(sentence_type), newest)
+
+    def discard_nmea_sentences(self, sentence_type=None):
+        """removes all the queued NMEA sentences of the given type"""
+        self._discard_matches(self.nmea_sentences, self._nmea_matcher(sentence_type))
+
+    def clear(self):
+        self._buffer.clear()
+        self.ubx_messages.clear()
+        self.nmea_sentences.clear()
@@ -3,3 +3,5 @@
 """
 
 from melopero_samm8q.SAM_M8Q import SAM_M8Q
+from melopero_samm8q.StreamDemultiplexer import StreamDemultiplexer
+import melopero_samm8q.NMEA_MSG as nmea
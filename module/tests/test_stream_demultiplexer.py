@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Leonardo La Rocca
+"""
+import melopero_ubx as ubx
+from melopero_samm8q import StreamDemultiplexer, nmea
+
+GGA = nmea.compose_sentence("GPGGA,092725.00,4717.11399,N,00833.91590,E,1,08,1.01,499.6,M,48.0,M,,")
+RMC = b"$GPRMC,083559.00,A,4717.11437,N,00833.91522,E,0.004,77.52,091202,,,A*57\r\n"
+VTG = nmea.compose_sentence("GPVTG,77.52,T,,M,0.004,N,0.008,K,A")
+GSV = nmea.compose_sentence("GPGSV,3,1,10,23,38,230,44,29,71,156,47,07,29,116,41,08,09,081,36")
+PUBX = nmea.compose_sentence("PUBX,00,081350.00,4717.113210,N,00833.915187,E")
+
+
+def ubx_frame(payload, msg_cls=ubx.NAV_CLASS, msg_id=ubx.NAV_PVT):
+    return bytes(ubx.compose_message(msg_cls, msg_id, len(payload), payload))
+
+
+# a payload containing both '$' and '\n'
+NAV_PVT = ubx_frame([0x01, 0x24, 0x02, 0x0A, 0x03])
+
+
+def feed_in_chunks(demux, data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        demux.feed(data[i:i + chunk_size])
+
+
+def sentence_types(demux):
+    return [sentence.sentence_type for sentence in demux.nmea_sentences]
+
+
+def test_mixed_stream_split_across_chunks():
+    stream = b"\x00garbage" + GGA + NAV_PVT + RMC + bytes([ubx.SYNC_CHAR_1]) + VTG + NAV_PVT
+    for chunk_size in (1, 3, 7, len(stream)):
+        demux = StreamDemultiplexer()
+        feed_in_chunks(demux, stream, chunk_size)
+        assert list(demux.ubx_messages) == [list(NAV_PVT), list(NAV_PVT)]
+        assert sentence_types(demux) == [nmea.GGA, nmea.RMC, nmea.VTG]
+        assert len(demux._buffer) == 0
+
+
+def test_incomplete_frames_are_kept():
+    demux = StreamDemultiplexer()
+    demux.feed(NAV_PVT[:-1])
+    assert not demux.ubx_messages
+    demux.feed(NAV_PVT[-1:] + GGA[:10])
+    assert list(demux.ubx_messages) == [list(NAV_PVT)]
+    assert not demux.nmea_sentences
+    demux.feed(GGA[10:])
+    assert sentence_types(demux) == [nmea.GGA]
+
+
+def test_wrong_checksums_are_dropped():
+    bad_ubx = NAV_PVT[:-1] + bytes([NAV_PVT[-1] ^ 0xFF])
+    bad_nmea = GGA.replace(b"*", b"*F", 1)[:-3] + b"\r\n"
+    demux = StreamDemultiplexer()
+    demux.feed(bad_ubx + bad_nmea + b"$bad*00\r\n" + RMC)
+    assert not demux.ubx_messages
+    assert sentence_types(demux) == [nmea.RMC]
+
+
+def test_stray_dollar_before_ubx_frame():
+    demux = StreamDemultiplexer()
+    demux.feed(b"$" + NAV_PVT)
+    assert list(demux.ubx_messages) == [list(NAV_PVT)]
+
+    demux = StreamDemultiplexer()
+    demux.feed(b"$GPGG" + NAV_PVT + GGA)
+    assert list(demux.ubx_messages) == [list(NAV_PVT)]
+    assert sentence_types(demux) == [nmea.GGA]
+
+
+def test_stray_dollars_before_sentence():
+    demux = StreamDemultiplexer()
+    demux.feed(b"$$" + VTG)
+    assert demux.pop_nmea_sentence(nmea.VTG).talker == "GP"
+
+
+def test_corrupted_ubx_header_does_not_block_nmea():
+    demux = StreamDemultiplexer()
+    demux.feed(b"\xb5\x62\x01\x07\xe0\x03" + GGA + RMC)
+    assert sentence_types(demux) == [nmea.GGA, nmea.RMC]
+    assert len(demux._buffer) == 0
+
+
+def test_proprietary_sentence():
+    demux = StreamDemultiplexer()
+    demux.feed(PUBX)
+    assert [sentence.raw for sentence in demux.nmea_sentences] == [PUBX[1:-5].decode()]
+
+
+def test_pop_newest_drops_older_matches():
+    demux = StreamDemultiplexer()
+    for i in range(5):
+        demux.feed(ubx_frame([i]))
+    demux.feed(ubx_frame([0x01], ubx.ACK_CLASS, ubx.ACK_ACK))
+    assert demux.pop_ubx_message(ubx.NAV_CLASS, ubx.NAV_PVT, newest=True)[6] == 4
+    assert demux.pop_ubx_message(ubx.NAV_CLASS, ubx.NAV_PVT) is None
+    assert len(demux.ubx_messages) == 1
+
+    for _ in range(3):
+        demux.feed(GGA)
+    demux.feed(RMC)
+    assert demux.pop_nmea_sentence(nmea.GGA, newest=True) is not None
+    assert sentence_types(demux) == [nmea.RMC]
+
+
+def test_pop_matches_payload_prefix():
+    demux = StreamDemultiplexer()
+    demux.feed(ubx_frame([ubx.CFG_CLASS, ubx.CFG_PRT], ubx.ACK_CLASS, ubx.ACK_ACK))
+    demux.feed(ubx_frame([ubx.CFG_CLASS, ubx.CFG_MSG], ubx.ACK_CLASS, ubx.ACK_ACK))
+    msg = demux.pop_ubx_message(ubx.ACK_CLASS, payload_prefix=[ubx.CFG_CLASS, ubx.CFG_MSG])
+    assert msg[7] == ubx.CFG_MSG
+    assert len(demux.ubx_messages) == 1
+
+
+def test_parse_gga():
+    data = nmea.sentence_to_dict(nmea.parse_sentence(GGA))
+    assert (data[nmea.HOUR_TAG], data[nmea.MINUTE_TAG], data[nmea.SECOND_TAG]) == (9, 27, 25.0)
+    assert abs(data[nmea.LATITUDE_TAG] - 47.2852332) < 1e-6
+    assert abs(data[nmea.LONGITUDE_TAG] - 8.565265) < 1e-6
+    assert data[nmea.QUALITY_TAG] == "autonomous GNSS fix"
+    assert data[nmea.NUM_SATELLITES_TAG] == 8
+    assert data[nmea.HDOP_TAG] == 1.01
+    assert data[nmea.MSL_HEIGHT_TAG] == 499.6
+    assert data[nmea.GEOID_SEPARATION_TAG] == 48.0
+    assert data[nmea.TALKER_TAG] == "GP"
+
+
+def test_parse_rmc():
+    data = nmea.sentence_to_dict(nmea.parse_sentence(RMC))
+    assert data[nmea.VALID_TAG]
+    assert (data[nmea.DAY_TAG], data[nmea.MONTH_TAG], data[nmea.YEAR_TAG]) == (9, 12, 2002)
+    assert data[nmea.GROUND_SPEED_KNOTS_TAG] == 0.004
+    assert data[nmea.COURSE_TRUE_TAG] == 77.52
+    assert data[nmea.MAGNETIC_VARIATION_TAG] is None
+    assert data[nmea.MODE_TAG] == "A"
+
+
+def test_parse_vtg():
+    data = nmea.sentence_to_dict(nmea.parse_sentence(VTG))
+    assert data[nmea.COURSE_TRUE_TAG] == 77.52
+    assert data[nmea.COURSE_MAGNETIC_TAG] is None
+    assert data[nmea.GROUND_SPEED_KMH_TAG] == 0.008
+
+
+def test_parse_gsv():
+    data = nmea.sentence_to_dict(nmea.parse_sentence(GSV))
+    assert (data[nmea.NUM_MESSAGES_TAG], data[nmea.MESSAGE_NUMBER_TAG]) == (3, 1)
+    assert data[nmea.SATELLITES_IN_VIEW_TAG] == 10
+    assert [sat[nmea.SV_ID_TAG] for sat in data[nmea.SATELLITES_TAG]] == [23, 29, 7, 8]
+    assert data[nmea.SATELLITES_TAG][3] == {nmea.SV_ID_TAG: 8, nmea.ELEVATION_TAG: 9,
+                                            nmea.AZIMUTH_TAG: 81, nmea.CN0_TAG: 36}
+
+
+def test_empty_fields_are_none():
+    gga = nmea.compose_sentence("GPGGA,,,,,,,,,,M,,M,,")
+    data = nmea.sentence_to_dict(nmea.parse_sentence(gga))
+    for tag in (nmea.HOUR_TAG, nmea.MINUTE_TAG, nmea.SECOND_TAG, nmea.LATITUDE_TAG,
+                nmea.QUALITY_TAG, nmea.NUM_SATELLITES_TAG, nmea.MSL_HEIGHT_TAG):
+        assert data[tag] is None
+
+    rmc = nmea.compose_sentence("GPRMC,,V,,,,,,,,,,N")
+    data = nmea.sentence_to_dict(nmea.parse_sentence(rmc))
+    assert not data[nmea.VALID_TAG]
+    assert data[nmea.YEAR_TAG] is None and data[nmea.HOUR_TAG] is None